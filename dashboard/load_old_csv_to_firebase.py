@@ -1,8 +1,14 @@
 import csv
+import gzip
+import orjson
 import requests
 import time
 import sys
-from typing import Dict, Any, List
+import pandas as pd
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, Any, List, Set
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # --- Configuration ---
 # NOTE: Updated Firebase Realtime Database URL
@@ -11,14 +17,35 @@ FIREBASE_BASE_URL = "https://iot-sensors-pi-78113-default-rtdb.europe-west1.fire
 SENSOR_ID = "raspi_4b"
 # Maximum number of log entries to send in a single HTTP POST request
 BATCH_SIZE = 500
+# Upload batches parsed per pandas read (fewer, larger parser calls)
+BATCHES_PER_READ = 4
+# Number of batches allowed in flight at once (each batch is an independent POST)
+MAX_CONCURRENT_UPLOADS = 8
+# Gzip each batch body (Content-Encoding: gzip); numeric JSON shrinks ~5-10x
+GZIP_BATCHES = True
 # --- End Configuration ---
 
-def send_batch_to_firebase(url: str, sensor_id: str, batch_data: List[Dict[str, Any]]):
+def create_session() -> requests.Session:
+    """
+    Builds a requests.Session that keeps one pooled TLS connection to Firebase
+    alive across batches and retries connections that could not be opened.
+    """
+    session = requests.Session()
+    # Only connection failures are retried (the batch was never sent). Each POST
+    # gets fresh push keys, so re-sending after a 5xx or a read timeout could
+    # write the batch twice; urllib3 leaves POST out of those retries by default.
+    retry = Retry(total=3, backoff_factor=0.5)
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=20, max_retries=retry))
+    session.headers["Content-Type"] = "application/json"
+    return session
+
+def send_batch_to_firebase(session: requests.Session, url: str, sensor_id: str, batch_data: List[Dict[str, Any]]):
     """
     Sends a batch of formatted sensor data points as a single POST request 
     to a Firebase Realtime Database-style endpoint.
     
     The POST request will append a new unique ID for each item in the batch.
+    The shared session is reused so consecutive batches skip the TCP+TLS handshake.
     """
     
     if not batch_data:
@@ -28,16 +55,23 @@ def send_batch_to_firebase(url: str, sensor_id: str, batch_data: List[Dict[str,
     # Construct the full URL: e.g., https://<BASE_URL>/<SENSOR_ID>.json
     full_url = f"{url}/{sensor_id}.json"
     
-    # We send the list of dictionaries as the JSON payload.
+    # We send the list of dictionaries as the (optionally gzipped) JSON payload.
     batch_size = len(batch_data)
     first_timestamp = batch_data[0].get('timestamp', 'N/A')
     last_timestamp = batch_data[-1].get('timestamp', 'N/A')
     
     print(f"📦 Sending batch of {batch_size} records (from {first_timestamp} to {last_timestamp})...")
 
+    # orjson writes compact bytes directly and encodes NaN as null
+    body = orjson.dumps(batch_data)
+    headers = {}
+    if GZIP_BATCHES:
+        body = gzip.compress(body)
+        headers["Content-Encoding"] = "gzip"
+
     try:
         # We include a small timeout to prevent hanging forever
-        response = requests.post(full_url, json=batch_data, timeout=10)
+        response = session.post(full_url, data=body, headers=headers, timeout=10)
         
         # Firebase RTDB returns a 200 status code on success
         if response.status_code == 200:
@@ -49,77 +83,84 @@ def send_batch_to_firebase(url: str, sensor_id: str, batch_data: List[Dict[str,
     except requests.exceptions.RequestException as e:
         print(f"⚠️ Connection Error: Failed to connect or timed out. {e}")
 
+def submit_batch(pool: ThreadPoolExecutor, in_flight: Set[Future], session: requests.Session,
+                 url: str, sensor_id: str, batch_data: List[Dict[str, Any]]):
+    """
+    Hands a batch to the upload pool, first waiting for a free slot so that at
+    most MAX_CONCURRENT_UPLOADS batches are buffered or on the wire at a time.
+    """
+    if len(in_flight) >= MAX_CONCURRENT_UPLOADS:
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            in_flight.discard(future)
+            future.result()  # Surface unexpected errors from the worker thread
+
+    in_flight.add(pool.submit(send_batch_to_firebase, session, url, sensor_id, batch_data))
+
 def process_log_file(filepath: str, base_url: str, sensor_id: str):
     """
-    Opens the CSV log file, processes it row by row, collects rows into batches,
-    and sends the batches to the Firebase endpoint.
+    Opens the CSV log file, parses it with pandas BATCHES_PER_READ batches at
+    a time, and sends each BATCH_SIZE slice to the Firebase endpoint.
+
+    Batches are uploaded concurrently over the shared session; Firebase assigns
+    each POST its own key, so the order in which they complete does not matter.
     """
 
-    current_batch: List[Dict[str, Any]] = []
-    # Initialize reader to None outside the try/except scope for safety, 
-    # though strictly, it's not needed if all use is inside the 'with' block.
-    # The true fix is ensuring the exception block catches the right error.
+    in_flight: Set[Future] = set()
 
     try:
         print(f"Starting to process file: {filepath}...")
         
         # Use a nested try-except specifically for file opening
         try:
-            # Use csv.DictReader to easily access columns by header name
+            # --- Schema, resolved once from the header row ---
             with open(filepath, mode='r', newline='') as file:
-                reader = csv.DictReader(file)
-    
-                # Iterate over each row (which is treated as a dictionary)
-                for i, row in enumerate(reader):
-                    data: Dict[str, Any] = {}
-                    # row_number is the actual line number in the CSV (1-based index)
-                    row_number = i + 2
-    
+                header = next(csv.reader(file), [])
+            # Skip mask aligned to column order: blank headers and columns
+            # ending in '_present' (e.g., 'aht21_present') are never parsed
+            skip = [not name or name.endswith('_present') for name in header]
+            keep_idx = [i for i, skipped in enumerate(skip) if not skipped]
+            keep_cols = [header[i] for i in keep_idx]
+            # 'timestamp' is kept as a string; all other columns are numeric
+            value_cols = [c for c in keep_cols if c != 'timestamp']
+
+            # One pooled session for every batch of this file.
+            # Skipped columns are never tokenized; pandas' C parser converts the rest.
+            with create_session() as session, \
+                    ThreadPoolExecutor(max_workers=MAX_CONCURRENT_UPLOADS) as pool, \
+                    pd.read_csv(filepath, chunksize=BATCH_SIZE * BATCHES_PER_READ, usecols=keep_idx,
+                                dtype={'timestamp': str}, on_bad_lines='skip') as reader:
+
+                for chunk in reader:
                     # --- Data Processing and Conversion ---
-                    is_valid_row = True
-                    for key, value in row.items():
-                        
-                        # Add the crucial check from the previous fix attempt
-                        if key is None:
-                            print(f"⚠️ Warning on row {row_number}: Skipping column with a blank header.")
-                            continue
-                            
-                        # 1. Skip columns ending in '_present' (e.g., 'aht21_present')
-                        if key.endswith('_present'):
+                    # Columns the parser could not read as numbers hold stray text:
+                    # only those are coerced, and rows with such text are skipped.
+                    text_cols = [c for c in value_cols if chunk[c].dtype == object]
+                    if text_cols:
+                        # Whitespace-only cells count as blank (null), not as stray text
+                        text = chunk[text_cols].apply(lambda col: col.str.strip()).replace('', None)
+                        numeric = text.apply(pd.to_numeric, errors='coerce')
+                        invalid = (numeric.isna() & text.notna()).any(axis=1)
+                        for idx in chunk.index[invalid]:
+                            # idx + 2 is the actual line number in the CSV (1-based, after header)
+                            print(f"Skipping row {idx + 2}: Non-numeric value found.")
+
+                        chunk[text_cols] = numeric
+                        chunk = chunk[~invalid]
+                        if chunk.empty:
                             continue
 
-                        # 2. 'timestamp' is kept as a string
-                        if key == 'timestamp':
-                            data[key] = value
-                            continue
-
-                        # 3. Attempt to convert all other values to float for numerical storage
-                        try:
-                            # Convert empty strings to None, otherwise convert to float
-                            if value is None or value.strip() == '':
-                                data[key] = None
-                            else:
-                                data[key] = float(value)
-                        except ValueError:
-                            # Handle cases where expected numerical data is invalid
-                            print(f"Skipping row {row_number}: Non-numeric value '{value}' found for column '{key}'.")
-                            is_valid_row = False
-                            break      # Stop processing this row keys
+                    # Empty cells stay NaN here; orjson serializes them as JSON null
+                    records = [dict(zip(keep_cols, row)) for row in chunk.itertuples(index=False, name=None)]
 
                     # --- Batching Logic ---
-                    if is_valid_row and data:
-                        current_batch.append(data)
-
-                        # If the batch is full, send it and reset
-                        if len(current_batch) >= BATCH_SIZE:
-                            send_batch_to_firebase(base_url, sensor_id, current_batch)
-                            current_batch = []
-                            # time.sleep(0.5)
-
-            # --- Send Final (Partial) Batch ---
-            if current_batch:
-                print("Sending final partial batch...")
-                send_batch_to_firebase(base_url, sensor_id, current_batch)
+                    for start in range(0, len(records), BATCH_SIZE):
+                        submit_batch(pool, in_flight, session, base_url, sensor_id,
+                                     records[start:start + BATCH_SIZE])
+
+                # Wait for the remaining uploads before the session is closed
+                for future in wait(in_flight).done:
+                    future.result()
             
         except FileNotFoundError:
             # Re-raise or handle the FileNotFoundError separately for clarity
@@ -1,12 +1,20 @@
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 from datetime import datetime, timedelta
 import os
+import io
+import csv
+import asyncio
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 templates = Jinja2Templates(directory="templates")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -18,54 +26,280 @@ def get_latest_csv():
 
 LOG_DIR = os.path.expanduser("~/airstation/logs")
 
+# Columns the dashboard serves; anything else in the log is skipped at parse time.
+# Declared dtypes let the C parser skip per-file type inference; float32 holds
+# the sensors' few significant figures at half the memory traffic of float64.
+LOG_DTYPES = {
+    "temperature_C": "float32",
+    "humidity_pct": "float32",
+    "AQI": "float32",
+    "TVOC_ppb": "float32",
+    "eCO2_ppm": "float32",
+    "pressure_hPa": "float32",
+    "altitude_m": "float32",
+    "co2_ppm": "float32",
+}
+LOG_COLUMNS = ["timestamp", *LOG_DTYPES]
+# The same schema for Arrow's CSV reader, which types columns while parsing
+ARROW_TYPES = {"timestamp": pa.timestamp("ns"), **{c: pa.float32() for c in LOG_DTYPES}}
+
+# Default cap on rows sent to the trend chart by /api/data (see downsample)
+MAX_PLOT_POINTS = 1000
+
+# Parsed log files keyed by path -> {"key": (mtime_ns, size), "df": DataFrame,
+# "offset": bytes of the CSV consumed so far, "header": CSV column names}
+_file_cache = {}
+
+def resolve_log_path(day):
+    """Return a day's Parquet copy if it is at least as new as its CSV, else the CSV (or None).
+
+    capture.py writes its last buffered rows to yesterday's CSV at the first
+    tick after midnight, which can be after the file was compacted; a CSV
+    newer than its Parquet copy is read again and re-compacted.
+    """
+    mtimes = {}
+    for ext in (".parquet", ".csv"):
+        p = os.path.join(LOG_DIR, f"{day}{ext}")
+        try:
+            mtimes[p] = os.stat(p).st_mtime_ns
+        except FileNotFoundError:
+            pass
+    if not mtimes:
+        return None
+    # Parquet first, so it wins a tie with the CSV it was written from
+    return max(mtimes, key=mtimes.get)
+
+def write_parquet(df, csv_path):
+    """Store a finished day's parsed log next to its CSV as Parquet (written atomically)."""
+    dest = os.path.splitext(csv_path)[0] + ".parquet"
+    tmp = dest + ".tmp"
+    try:
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, dest)
+    except Exception as e:
+        print(f"⚠️ Could not write {dest}: {e}")
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def parse_log_csv(buf, names):
+    """Parse headerless CSV log text from buf into the served columns with a typed timestamp.
+
+    Arrow's multithreaded reader converts the timestamp and values as it
+    parses; a file it cannot type (say, a non-numeric cell) goes through
+    the pandas path, which coerces bad values to NaN/NaT.
+    """
+    try:
+        table = pacsv.read_csv(
+            buf,
+            read_options=pacsv.ReadOptions(column_names=names),
+            parse_options=pacsv.ParseOptions(invalid_row_handler=lambda row: "skip"),
+            convert_options=pacsv.ConvertOptions(
+                column_types=ARROW_TYPES,
+                include_columns=[c for c in LOG_COLUMNS if c in names],
+            ),
+        )
+        df = table.to_pandas(split_blocks=True, self_destruct=True)
+    except pa.ArrowInvalid:
+        buf.seek(0)
+        df = parse_log_csv_pandas(buf, names)
+    return df.dropna(subset=["timestamp"])  # drop rows with invalid timestamps
+
+def parse_log_csv_pandas(buf, names):
+    """Fallback for parse_log_csv using pandas' C parser."""
+    csv_kwargs = dict(
+        engine="c",
+        header=None,
+        names=names,
+        usecols=lambda c: c in LOG_COLUMNS,
+        parse_dates=["timestamp"],
+        date_format="ISO8601",
+        on_bad_lines="skip",  # Skip malformed rows automatically
+    )
+    try:
+        df = pd.read_csv(buf, dtype=LOG_DTYPES, **csv_kwargs)
+    except ValueError:
+        # A non-numeric cell somewhere: parse untyped and coerce it to NaN
+        buf.seek(0)
+        df = pd.read_csv(buf, **csv_kwargs)
+        numeric = [c for c in LOG_DTYPES if c in df.columns]
+        df[numeric] = df[numeric].apply(pd.to_numeric, errors="coerce").astype("float32")
+
+    # Ensure timestamp column is valid datetime (a bad value leaves it unparsed)
+    if not pd.api.types.is_datetime64_any_dtype(df["timestamp"]):
+        df["timestamp"] = pd.to_datetime(df["timestamp"], errors='coerce', format="ISO8601")
+    return df
+
+def read_csv_from(p, offset=0, header=None):
+    """Parse the complete lines of CSV p from byte offset onwards.
+
+    capture.py only appends, so a re-read can start where the previous one
+    stopped. A trailing partial line (write in progress) is left for next time.
+    Returns (df, new_offset, header).
+    """
+    with open(p, "rb") as f:
+        if offset == 0:
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                return None, 0, None  # Header not fully written yet
+            header = next(csv.reader([line.decode()]))
+            offset = len(line)
+        f.seek(offset)
+        data = f.read()
+
+    end = data.rfind(b"\n") + 1
+    if end == 0:
+        return None, offset, header  # No complete new line yet
+    df = parse_log_csv(io.BytesIO(data[:end]), header)
+    return df, offset + end, header
+
+def read_log_file(p, cached=None):
+    """Parse one log (Parquet or CSV). Returns a cache entry; its df is None if unusable.
+
+    For a CSV that only grew since the cached entry, just the new tail is parsed.
+    """
+    try:
+        # Parquet is already typed; only the served columns are read
+        if p.endswith(".parquet"):
+            available = pq.read_schema(p).names
+            df = pd.read_parquet(p, columns=[c for c in LOG_COLUMNS if c in available])
+            # Files compacted before the switch to float32 are narrowed on load
+            return {"df": df.astype({c: t for c, t in LOG_DTYPES.items() if c in df.columns})}
+
+        if cached and cached.get("df") is not None and os.path.getsize(p) >= cached["offset"]:
+            tail, offset, header = read_csv_from(p, cached["offset"], cached["header"])
+            df = cached["df"] if tail is None or tail.empty else pd.concat([cached["df"], tail], ignore_index=True)
+        else:
+            df, offset, header = read_csv_from(p)
+        return {"df": df, "offset": offset, "header": header}
+
+    except Exception as e:
+        print(f"⚠️ Error reading {p}: {e}")
+        return {"df": None}
+
+def load_log_file(p):
+    """Return the parsed DataFrame for p, re-reading only when its mtime/size changed."""
+    st = os.stat(p)
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _file_cache.get(p)
+    if cached is not None and cached["key"] == key:
+        return cached["df"]
+
+    entry = read_log_file(p, cached)
+    entry["key"] = key
+    _file_cache[p] = entry
+    return entry["df"]
+
+def rows_since(df, cutoff):
+    """Rows of df at or after cutoff.
+
+    Logs are appended in time order, so this is normally a bisect on the
+    timestamp column rather than a full boolean mask.
+    """
+    ts = df["timestamp"]
+    if ts.is_monotonic_increasing:
+        return df.iloc[ts.searchsorted(cutoff):]
+    return df[ts >= cutoff]
+
 def load_data():
-    """Load data from today's and yesterday's CSV files, skipping malformed lines."""
+    """Load data from today's and yesterday's logs, skipping malformed lines.
+
+    capture.py only appends to today's CSV, so yesterday's log is final: once
+    parsed it is compacted to Parquet and later loads read that instead.
+    """
 
     today = datetime.now().strftime("%Y-%m-%d")
     yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
-    paths = [
-        os.path.join(LOG_DIR, f"{yesterday}.csv"),
-        os.path.join(LOG_DIR, f"{today}.csv")
-    ]
+    # Last 24 hours, applied per file so older rows never reach concat/sort
+    cutoff = datetime.now() - timedelta(hours=24)
 
     dfs = []
 
-    for p in paths:
-        if not os.path.exists(p):
+    for day in (yesterday, today):
+        p = resolve_log_path(day)
+        if p is None:
             continue
 
-        try:
-            # Skip malformed rows automatically
-            df = pd.read_csv(p, on_bad_lines='skip')
+        df = load_log_file(p)
+        if df is None:
+            continue
+
+        if day != today and p.endswith(".csv"):
+            write_parquet(df, p)
+        dfs.append(rows_since(df, cutoff))
+
+    if not dfs:
+        return pd.DataFrame()
 
-            # Ensure timestamp column is valid datetime
-            if "timestamp" not in df.columns:
-                print(f"⚠️ Skipping file {p}: no timestamp column.")
-                continue
+    # Days are appended in time order and concatenated oldest first, so the
+    # merge is normally sorted already; only a clock step makes a sort necessary
+    df = pd.concat(dfs, ignore_index=True)
+    if not df["timestamp"].is_monotonic_increasing:
+        df = df.sort_values("timestamp", ignore_index=True)
+    return df
 
-            df["timestamp"] = pd.to_datetime(df["timestamp"], errors='coerce')
-            df = df.dropna(subset=["timestamp"])  # drop rows with invalid timestamps
+def m4_rows(values, starts, n):
+    """Row indices of each bin's first and last row and of every column's min and max.
 
-            dfs.append(df)
+    starts are the first row of each non-empty bin; values are the columns'
+    arrays. NaNs are ignored, and ties keep the earliest row in the bin.
+    """
+    sizes = np.diff(np.append(starts, n))
+    bin_of = np.repeat(np.arange(len(starts)), sizes)
+    rows = [starts, starts + sizes - 1]
+    for v in values:
+        for reduce in (np.fmin, np.fmax):
+            hit = np.flatnonzero(v == reduce.reduceat(v, starts)[bin_of])
+            # hit is ascending, so a bin's first tie is where its bin number changes
+            b = bin_of[hit]
+            rows.append(hit[np.r_[True, b[1:] != b[:-1]]] if len(hit) else hit)
+    return np.unique(np.concatenate(rows))
 
-        except Exception as e:
-            print(f"⚠️ Error reading {p}: {e}")
+def downsample(df, points):
+    """Reduce a time-sorted df to at most points rows with M4 (min/max per time bin).
 
-    if not dfs:
-        return pd.DataFrame()
+    Each series keeps its extremes in every bin, so short spikes survive
+    that a plain stride would skip; the first and newest rows are always kept.
+    All columns share one timestamp axis, so the bin count is bisected for
+    the finest binning whose combined rows still fit in points. A budget
+    too small even for one bin's extremes gets evenly spaced rows instead.
+    """
+    n = len(df)
+    if points <= 0 or n <= points:
+        return df
+    ts = df["timestamp"].to_numpy().view("i8")
+    values = [df[c].to_numpy() for c in df.columns if c != "timestamp"]
 
-    # Merge and sort combined data
-    df = pd.concat(dfs).sort_values("timestamp")
+    def select(bins):
+        # Uniform time edges; bins falling in a logging gap are dropped
+        edges = np.linspace(ts[0], ts[-1], bins + 1)[:-1]
+        return m4_rows(values, np.unique(np.searchsorted(ts, edges)), n)
 
-    # Filter to last 24 hours
-    cutoff = datetime.now() - timedelta(hours=24)
-    df = df[df["timestamp"] >= cutoff].reset_index(drop=True)
+    # Every bin contributes at least its first and last row
+    lo, hi = 1, max(1, points // 2)
+    best = None
+    while lo <= hi:
+        bins = (lo + hi) // 2
+        rows = select(bins)
+        if len(rows) <= points:
+            best, lo = rows, bins + 1
+        else:
+            hi = bins - 1
+    if best is None:
+        # Fewer points than the columns' extremes: plain stride, newest row last
+        best = np.unique(np.linspace(n - 1, 0, points).round().astype(np.intp))
+    return df.iloc[best]
 
-    return df
+# Serializes reloads so concurrent cache misses trigger a single re-read
+_load_lock = asyncio.Lock()
+
+async def load_data_async():
+    """Run the blocking load_data() in the threadpool, keeping the event loop free."""
+    async with _load_lock:
+        return await run_in_threadpool(load_data)
 
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
-    df = load_data()
+    df = await load_data_async()
     if df.empty:
         return templates.TemplateResponse("index.html", {"request": request, "latest": {}, "data": []})
     latest = df.iloc[-1].to_dict()
@@ -74,23 +308,27 @@ async def home(request: Request):
 
 @app.get("/api/latest")
 async def api_latest():
-    df = load_data()
+    df = await load_data_async()
     if df.empty:
-        return JSONResponse({})
-    latest = df.iloc[-1].to_dict()
+        return ORJSONResponse({})
+    # Per-column scalars keep their float32 type (iloc[-1] on the frame would
+    # widen them to Python floats and leak digits like 20.100000381469727)
+    latest = {c: df[c].iloc[-1] for c in df.columns}
     # Convert timestamp to string
     if isinstance(latest.get("timestamp"), pd.Timestamp):
         latest["timestamp"] = latest["timestamp"].isoformat()
-    return JSONResponse(latest)
+    return ORJSONResponse(latest)
 
 @app.get("/api/data")
-async def api_data():
-    df = load_data()
-    if df.empty:
-        return JSONResponse([])
-    # Convert all timestamps to string
-    df["timestamp"] = df["timestamp"].astype(str)
-    return JSONResponse(df.to_dict(orient="records"))
+async def api_data(points: int = MAX_PLOT_POINTS):
+    """Return the last 24h column-wise: {column: [values...]} with one array per column.
+
+    Rows are downsampled to at most points (0 sends every row), which bounds
+    the payload and the browser's plotting work however long the window is.
+    orjson encodes the NumPy arrays directly, so no per-row dicts are built.
+    """
+    df = downsample(await load_data_async(), points)
+    return ORJSONResponse({c: np.ascontiguousarray(df[c].to_numpy()) for c in df.columns})
 
 if __name__ == "__main__":
     import uvicorn
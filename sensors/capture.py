@@ -3,9 +3,10 @@
 Features:
  - Robust error handling (per-sensor) so one failure doesn't stop logging
  - Fallback mock CO2 value if MH-Z19 read fails (optional)
+ - MH-Z19 polled on a background thread so serial latency doesn't delay sampling
  - Automatic CSV header creation
  - Derived dew point (simple approximate formula assuming fixed RH)
- - Configurable interval via INTERVAL_SECONDS constant
+ - Configurable interval via INTERVAL_SECONDS constant (drift-corrected)
  - Timestamp in ISO 8601 format for easier parsing
 
 CSV Columns:
@@ -20,8 +21,11 @@ Notes:
  - You must have freed /dev/serial0 from serial-getty for MH-Z19.
 """
 
+import os
 import time
 import csv
+import atexit
+import threading
 from datetime import datetime, timezone
 import math
 import board
@@ -40,6 +44,7 @@ ENABLE_AHTX0 = True  # Attempt to read humidity via AHTx0 sensor
 # State for humidity sensor
 _aht = None  # AHTx0 instance (lazy init)
 USE_CO2_MOCK_ON_FAIL = True
+MHZ19_POLL_SECONDS = 10  # Background serial poll period for MH-Z19
 
 ###############################################################################
 # BMP180 Lazy/Resilient Initialization
@@ -93,6 +98,10 @@ def read_bmp():
         "altitude_m": _bmp.altitude,
     }
 
+# Magnus formula coefficients (Sonntag 1990, valid -45..60 °C)
+MAGNUS_A = 17.62
+MAGNUS_B = 243.12
+
 def approximate_dew_point(temp_c: float, rh: float) -> float:
     """Return dew point in °C given temperature (°C) and relative humidity (%).
 
@@ -102,19 +111,16 @@ def approximate_dew_point(temp_c: float, rh: float) -> float:
 
     Falls back to a simple linear approximation if math domain errors occur.
     """
+    if not USE_MAGNUS_DEWPOINT:
+        return temp_c - ((100 - rh) / 5.0)
+    if rh <= 0:
+        return float('nan')
     try:
-        if USE_MAGNUS_DEWPOINT:
-            if rh <= 0:
-                return float('nan')
-            a = 17.62
-            b = 243.12
-            gamma = (a * temp_c) / (b + temp_c) + math.log(rh/100.0)
-            return (b * gamma) / (a - gamma)
-    except Exception:
+        gamma = (MAGNUS_A * temp_c) / (MAGNUS_B + temp_c) + math.log(rh / 100.0)
+        return (MAGNUS_B * gamma) / (MAGNUS_A - gamma)
+    except (ValueError, ZeroDivisionError):
         # Fallback linear approximation (rough)
         return temp_c - ((100 - rh) / 5.0)
-    # If Magnus disabled
-    return temp_c - ((100 - rh) / 5.0)
 
 def init_aht():
     """Lazy init for AHTx0 humidity sensor; returns instance or None if unavailable."""
@@ -159,6 +165,30 @@ def read_mhz19():
         else:
             return {"co2_ppm": "", "co2_source": "error", "error": str(e)}
 
+# Latest MH-Z19 reading, written by the serial thread and snapshotted by the main loop
+_mhz19_latest: Optional[dict] = None
+_mhz19_lock = threading.Lock()
+
+def _mhz19_loop():
+    """Poll the MH-Z19 on its own thread so UART latency never stalls the I2C sampling."""
+    global _mhz19_latest
+    while True:
+        reading = read_mhz19()
+        with _mhz19_lock:
+            _mhz19_latest = reading
+        time.sleep(MHZ19_POLL_SECONDS)
+
+def start_mhz19_thread():
+    """Seed the reading slot with one blocking read, then keep it fresh in the background."""
+    global _mhz19_latest
+    _mhz19_latest = read_mhz19()
+    threading.Thread(target=_mhz19_loop, name="mhz19", daemon=True).start()
+
+def peek_mhz19() -> dict:
+    """Return the most recent MH-Z19 reading without touching the serial port."""
+    with _mhz19_lock:
+        return _mhz19_latest
+
 def ensure_csv_header(path: str):
     header = [
         "timestamp",
@@ -171,12 +201,9 @@ def ensure_csv_header(path: str):
         "co2_source",
         "errors",
     ]
-    need_header = False
+    # An empty or missing file needs a header; anything else already has one
     try:
-        with open(path, "r", newline="") as f:
-            first = f.readline()
-            if not first.strip():
-                need_header = True
+        need_header = os.stat(path).st_size == 0
     except FileNotFoundError:
         need_header = True
     if need_header:
@@ -191,9 +218,17 @@ print("Press Ctrl+C to stop.\n")
 # Attempt BMP init early (non-fatal if missing)
 init_bmp()
 
+# MH-Z19 is read on its own thread; the loop below only snapshots the latest value
+start_mhz19_thread()
+
+# One handle + writer for the life of the process instead of open/close per row
+_csv_fp = open(LOG_FILE, "a", newline="")
+_csv_writer = csv.writer(_csv_fp)
+atexit.register(_csv_fp.close)
+
 def log_row(row):
-    with open(LOG_FILE, "a", newline="") as f:
-        csv.writer(f).writerow(row)
+    _csv_writer.writerow(row)
+    _csv_fp.flush()  # Keep the row on disk even if the process is killed
 
 # -------------------------------
 # Create CSV with header (if new)
@@ -248,6 +283,9 @@ def scan_i2c_addresses(max_addr: int = 0x77):
             continue
     return found
 
+# Samples are scheduled against a monotonic deadline so the loop's own work
+# time does not stretch the period beyond INTERVAL_SECONDS
+deadline = time.monotonic()
 while True:
     try:
         errors = []
@@ -289,8 +327,8 @@ while True:
         else:
             dew_point = ""
 
-        # MH-Z19
-        co2_info = read_mhz19()
+        # MH-Z19 (latest value from the serial thread)
+        co2_info = peek_mhz19()
         if "error" in co2_info:
             errors.append(f"mh_z19:{co2_info['error']}")
 
@@ -325,7 +363,13 @@ while True:
             )
         )
 
-        time.sleep(INTERVAL_SECONDS)
+        deadline += INTERVAL_SECONDS
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        else:
+            # Fell more than a full interval behind: re-anchor instead of bursting
+            deadline = time.monotonic()
 
     except KeyboardInterrupt:
         print("\nLogging stopped by user.")
@@ -334,4 +378,5 @@ while True:
         # Catch-all for unexpected top-level loop errors
         print(f"Fatal loop error: {e}")
         time.sleep(5)
+        deadline = time.monotonic()
 
@@ -35,8 +35,9 @@ def open_port():
     raise SystemExit("No serial device opened.")
 
 
-def compute_checksum(payload: bytes) -> int:
-    return (0xFF - (sum(payload[1:8]) % 256) + 1) & 0xFF
+def compute_checksum(p: bytes) -> int:
+    # Unrolled sum of bytes 1..7: no slice allocation or sum() iterator
+    return (0x100 - ((p[1] + p[2] + p[3] + p[4] + p[5] + p[6] + p[7]) & 0xFF)) & 0xFF
 
 
 def main():
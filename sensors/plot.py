@@ -1,36 +1,109 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 import argparse
+import io
+import mmap
 import os
 import sys
+import time
+from datetime import datetime, timedelta
 from typing import Optional, Sequence
+import numpy as np
 import pandas as pd
+from pandas.tseries.frequencies import to_offset
 import matplotlib
-# Use a non-interactive backend automatically if no display (common on headless Pi)
-if not os.environ.get("DISPLAY"):
-    matplotlib.use("Agg")  # noqa: E402
-import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 
+plt = None  # matplotlib.pyplot, imported by _init_mpl() once the backend is chosen
+
 
 DEFAULT_PRESSURE_COL = "pressure_hPa"
 DEFAULT_TEMP_COL = "temperature_C"
 DEFAULT_TIME_COL = "timestamp"
 
 
+def _init_mpl(headless: bool) -> None:
+    """Select the backend, then import pyplot.
+
+    Deferred until after argument parsing so save-only runs pin Agg before
+    pyplot can resolve an interactive (tk/qt/gtk) backend.
+    """
+    global plt
+    # Use a non-interactive backend if no display (common on headless Pi) or nothing is shown
+    if headless or not os.environ.get("DISPLAY"):
+        matplotlib.use("Agg", force=True)
+    import matplotlib.pyplot as plt
+
+
+def read_tail(path: str, time_col: str, hours: float) -> bytes:
+    """Return the header plus the trailing rows of a time-ordered CSV covering ~hours.
+
+    The file is memory-mapped and probed backwards in growing blocks, parsing
+    only the first timestamp of each block, so the cost scales with the tail
+    rather than the whole log. The slice may start a little before the window;
+    load_data trims it exactly. Falls back to the whole file if a probe fails.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            header_end = mm.find(b"\n") + 1
+            if header_end == 0:
+                return mm[:]
+            try:
+                time_idx = mm[:header_end].decode().rstrip("\r\n").split(",").index(time_col)
+            except ValueError:
+                return mm[:]  # let read_csv report the missing column
+
+            def row_time(start):
+                end = mm.find(b"\n", start)
+                line = mm[start:end if end != -1 else len(mm)]
+                try:
+                    return datetime.fromisoformat(line.split(b",")[time_idx].decode())
+                except (IndexError, ValueError):
+                    return None
+
+            # Timestamp of the last complete row
+            end = len(mm) - 1 if mm[-1:] == b"\n" else len(mm)
+            last = row_time(mm.rfind(b"\n", 0, end) + 1)
+            if last is None:
+                return mm[:]
+            cutoff = last - timedelta(hours=hours)
+
+            start, block = len(mm), 1 << 16
+            while start > header_end:
+                pos = max(header_end, start - block)
+                start = pos if pos == header_end else mm.find(b"\n", pos) + 1
+                t = row_time(start)
+                if t is None or t < cutoff:
+                    break
+                block *= 2
+            return mm[:header_end] + mm[start:]
+
+
 def load_data(
     path: str,
     time_col: str,
     columns: Sequence[str],
     tz_localize: Optional[str] = None,
+    tail_hours: Optional[float] = None,
 ) -> pd.DataFrame:
     usecols = list({time_col, *columns})
     try:
-        df = pd.read_csv(
-            path,
-            usecols=usecols,
-            parse_dates=[time_col],
-        )
+        tail = read_tail(path, time_col, tail_hours) if tail_hours else None
+
+        def source():
+            return path if tail is None else io.BytesIO(tail)
+
+        try:
+            # pyarrow's multithreaded parser is several times faster on large logs
+            df = pd.read_csv(source(), usecols=usecols, engine="pyarrow")
+        except ImportError:
+            df = pd.read_csv(source(), usecols=usecols, low_memory=False)
+        except (KeyError, ValueError) as e:
+            # Re-parse with the C engine so errors are reported the same way
+            print(f"Warning: pyarrow could not parse {path} ({e}); using C engine.", file=sys.stderr)
+            df = pd.read_csv(source(), usecols=usecols, low_memory=False)
     except FileNotFoundError:
         sys.exit(f"Error: file not found: {path}")
     except ValueError as e:
@@ -39,23 +112,35 @@ def load_data(
     if df.empty:
         sys.exit("Error: dataset is empty.")
 
-    # Sort & drop duplicate timestamps
-    df = df.sort_values(time_col)
-    df = df.drop_duplicates(subset=time_col)
+    # Sensor readings carry ~0.1 resolution; float32 halves memory for rolling/resample
+    value_cols = [c for c in columns if c != time_col]
+    df[value_cols] = df[value_cols].apply(pd.to_numeric, errors="coerce").astype(np.float32)
+
+    if not pd.api.types.is_datetime64_any_dtype(df[time_col]):
+        df[time_col] = pd.to_datetime(df[time_col], format="ISO8601")
+
+    # Drop duplicate timestamps first so the sort runs on fewer rows
+    df = df.drop_duplicates(subset=time_col).sort_values(time_col)
+
+    if tail_hours:
+        # Sorted above, so the window start is a bisect rather than a full mask
+        ts = df[time_col]
+        df = df.iloc[ts.searchsorted(ts.iloc[-1] - pd.Timedelta(hours=tail_hours)):]
 
     if tz_localize and df[time_col].dt.tz is None:
-        df[time_col] = df[time_col].dt.tz_localize(tz_localize)
+        df[time_col] = df[time_col].dt.tz_localize(
+            tz_localize, nonexistent="shift_forward", ambiguous="NaT"
+        )
 
     return df.set_index(time_col)
 
 
 def maybe_filter_ranges(df: pd.DataFrame, pressure_col: str, temp_col: str) -> pd.DataFrame:
-    # Basic physical sanity filters (BMP180 typical ranges)
-    mask = (
-        (df[pressure_col].between(850, 1100, inclusive="both")) &
-        (df[temp_col].between(-40, 85, inclusive="both"))
-    )
-    return df[mask]
+    # Basic physical sanity filters (BMP180 typical ranges), one mask over raw arrays
+    p = df[pressure_col].to_numpy()
+    t = df[temp_col].to_numpy()
+    mask = (p >= 850) & (p <= 1100) & (t >= -40) & (t <= 85)
+    return df.iloc[mask]
 
 
 def resample_df(
@@ -65,21 +150,50 @@ def resample_df(
 ) -> pd.DataFrame:
     if not rule:
         return df
-    if rule:
-        return getattr(df.resample(rule), agg)()
-    return df
+    # Already at the requested cadence: resampling would only rebuild the same rows
+    src_freq = pd.infer_freq(df.index) if len(df.index) >= 3 else None
+    if src_freq and to_offset(src_freq) == to_offset(rule):
+        return df
+    return getattr(df.resample(rule), agg)()
+
+
+def _rolling_mean(values: np.ndarray, window: int, min_periods: int) -> np.ndarray:
+    """Trailing rolling mean via prefix sums; matches Series.rolling(...).mean().
+
+    NaNs are skipped and a window with fewer than min_periods valid points is NaN.
+    Sums accumulate in float64; the result keeps a float input's dtype.
+    """
+    values = np.asarray(values)
+    a = values.astype(np.float64, copy=False)
+    valid = ~np.isnan(a)
+    csum = np.concatenate(([0.0], np.cumsum(np.where(valid, a, 0.0))))
+    ccount = np.concatenate(([0], np.cumsum(valid)))
+    hi = np.arange(1, len(a) + 1)
+    lo = np.maximum(hi - window, 0)
+    count = ccount[hi] - ccount[lo]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = (csum[hi] - csum[lo]) / count
+    out[count < min_periods] = np.nan
+    return out.astype(values.dtype, copy=False) if values.dtype.kind == "f" else out
 
 
 def add_rolling(df: pd.DataFrame, cols: Sequence[str], window: Optional[int]) -> pd.DataFrame:
     if not window or window <= 1:
         return df
+    min_periods = max(1, window // 3)
     for c in cols:
         roll_name = f"{c}_roll{window}"
-        df[roll_name] = df[c].rolling(window, min_periods=max(1, window // 3)).mean()
+        df[roll_name] = pd.Series(_rolling_mean(df[c].to_numpy(), window, min_periods), index=df.index, copy=False)
     return df
 
 
-def build_plot(
+def plot_title(df: pd.DataFrame) -> str:
+    if len(df.index) > 1:
+        return f"Sensor data {df.index.min()} → {df.index.max()}"
+    return "Sensor data"
+
+
+def create_plot(
     df: pd.DataFrame,
     pressure_col: str,
     temp_col: str,
@@ -88,50 +202,38 @@ def build_plot(
     title: Optional[str] = None,
     date_fmt: str = "%H:%M",
 ):
+    if plt is None:
+        _init_mpl(headless=False)
     fig, ax_p = plt.subplots(figsize=figsize)
 
     ax_t = ax_p.twinx()
 
-    pressure_line, = ax_p.plot(
-        df.index,
-        df[pressure_col],
-        color="#1f77b4",
-        label="Pressure (hPa)",
-        linewidth=1.4,
-    )
-    temp_line, = ax_t.plot(
-        df.index,
-        df[temp_col],
-        color="#d62728",
-        label="Temperature (°C)",
-        linewidth=1.2,
-    )
-
-    # Rolling series (if present)
-    if show_rolling:
-        for col, base_color in ((pressure_col, "#1f77b4"), (temp_col, "#d62728")):
-            roll_col = next((c for c in df.columns if c.startswith(col + "_roll")), None)
-            if roll_col:
-                target_ax = ax_p if col == pressure_col else ax_t
-                target_ax.plot(
-                    df.index,
-                    df[roll_col],
-                    color=base_color,
-                    linewidth=2.0,
-                    alpha=0.5,
-                    label=f"{roll_col}",
-                )
+    line_refs = []  # (Line2D, column) pairs, for update_plot
+    # Base column -> its rolling column (e.g. pressure_hPa -> pressure_hPa_roll30)
+    roll_map = {c.rpartition("_roll")[0]: c for c in df.columns if "_roll" in c} if show_rolling else {}
+
+    def plot_series(ax, col, color, label, linewidth):
+        """Draw col and its rolling column (if shown) on ax with a single plot call."""
+        cols, labels = [col], [label]
+        roll_col = roll_map.get(col)
+        if roll_col:
+            cols.append(roll_col)
+            labels.append(roll_col)
+        lines = ax.plot(df.index, df[cols].to_numpy(), color=color, linewidth=linewidth, label=labels)
+        for roll_line in lines[1:]:
+            roll_line.set_linewidth(2.0)
+            roll_line.set_alpha(0.5)
+        line_refs.extend(zip(lines, cols))
+        return lines[0]
+
+    pressure_line = plot_series(ax_p, pressure_col, "#1f77b4", "Pressure (hPa)", 1.4)
+    temp_line = plot_series(ax_t, temp_col, "#d62728", "Temperature (°C)", 1.2)
 
     ax_p.set_xlabel("Time")
     ax_p.set_ylabel("Pressure (hPa)", color=pressure_line.get_color())
     ax_t.set_ylabel("Temperature (°C)", color=temp_line.get_color())
 
-    if not title:
-        if len(df.index) > 1:
-            title = f"Sensor data {df.index.min()} → {df.index.max()}"
-        else:
-            title = "Sensor data"
-    ax_p.set_title(title)
+    ax_p.set_title(title or plot_title(df))
 
     # Date formatting
     locator = mdates.AutoDateLocator()
@@ -149,7 +251,17 @@ def build_plot(
 
     fig.autofmt_xdate()
     fig.tight_layout()
-    return fig
+    return fig, ax_p, ax_t, line_refs
+
+
+def update_plot(ax_p, ax_t, line_refs, df: pd.DataFrame, title: Optional[str] = None) -> None:
+    """Point the existing lines at fresh data, keeping locators, legend and twin axis."""
+    for line, col in line_refs:
+        line.set_data(df.index, df[col].to_numpy())
+    for ax in (ax_p, ax_t):
+        ax.relim()
+        ax.autoscale_view()
+    ax_p.set_title(title or plot_title(df))
 
 
 def parse_args():
@@ -168,11 +280,16 @@ def parse_args():
     p.add_argument("--timezone", default=None, help="Localize naive timestamps (e.g. Europe/Berlin).")
     p.add_argument("--style", default="seaborn-v0_8", help="Matplotlib style (e.g. seaborn-v0_8, default, fast).")
     p.add_argument("--date-fmt", default="%H:%M", help="Hour tick label format.")
+    p.add_argument("--tail", type=float, metavar="HOURS", default=None,
+                   help="Only read the last HOURS of the log (seeks from the end of the file).")
+    p.add_argument("--watch", type=float, metavar="SECONDS", default=0,
+                   help="Reload the CSV and refresh the figure every SECONDS (0 disables).")
     return p.parse_args()
 
 
 def main():
     args = parse_args()
+    _init_mpl(headless=bool(args.save and args.no_show))
 
     # Style
     try:
@@ -180,29 +297,31 @@ def main():
     except OSError:
         print(f"Warning: style '{args.style}' not found, using default.", file=sys.stderr)
 
-    df = load_data(
-        args.input,
-        time_col=args.time_col,
-        columns=[args.pressure_col, args.temp_col],
-        tz_localize=args.timezone,
-    )
+    def prepare():
+        df = load_data(
+            args.input,
+            time_col=args.time_col,
+            columns=[args.pressure_col, args.temp_col],
+            tz_localize=args.timezone,
+            tail_hours=args.tail,
+        )
 
-    missing = [c for c in (args.pressure_col, args.temp_col) if c not in df.columns]
-    if missing:
-        sys.exit(f"Error: missing required columns in CSV: {missing}")
+        missing = [c for c in (args.pressure_col, args.temp_col) if c not in df.columns]
+        if missing:
+            sys.exit(f"Error: missing required columns in CSV: {missing}")
 
-    if args.filter_phys:
-        before = len(df)
-        df = maybe_filter_ranges(df, args.pressure_col, args.temp_col)
-        removed = before - len(df)
-        if removed:
-            print(f"Filtered {removed} out-of-range rows.")
+        if args.filter_phys:
+            before = len(df)
+            df = maybe_filter_ranges(df, args.pressure_col, args.temp_col)
+            removed = before - len(df)
+            if removed:
+                print(f"Filtered {removed} out-of-range rows.")
 
-    df = resample_df(df, args.resample, args.agg)
-    df = add_rolling(df, [args.pressure_col, args.temp_col], args.rolling if args.rolling > 1 else None)
+        df = resample_df(df, args.resample, args.agg)
+        return add_rolling(df, [args.pressure_col, args.temp_col], args.rolling if args.rolling > 1 else None)
 
-    fig = build_plot(
-        df,
+    fig, ax_p, ax_t, line_refs = create_plot(
+        prepare(),
         pressure_col=args.pressure_col,
         temp_col=args.temp_col,
         show_rolling=args.rolling > 1,
@@ -213,11 +332,31 @@ def main():
         fig.savefig(args.save, dpi=args.dpi)
         print(f"Saved: {args.save}")
 
-    if (not args.no_show) and matplotlib.get_backend().lower() != "agg":
+    interactive = (not args.no_show) and matplotlib.get_backend().lower() != "agg"
+
+    if args.watch > 0:
+        # Keep one figure alive and only swap the line data on each refresh
+        if interactive:
+            plt.show(block=False)
+        try:
+            while True:
+                if interactive:
+                    plt.pause(args.watch)
+                else:
+                    time.sleep(args.watch)
+                update_plot(ax_p, ax_t, line_refs, prepare())
+                if interactive:
+                    fig.canvas.draw_idle()
+                if args.save:
+                    fig.savefig(args.save, dpi=args.dpi)
+                    print(f"Saved: {args.save}")
+        except KeyboardInterrupt:
+            pass
+        plt.close(fig)
+    elif interactive:
         plt.show()
     else:
         plt.close(fig)
 
-
 if __name__ == "__main__":
     main()
@@ -8,6 +8,7 @@ Falls back to a mock value if:
 Usage: python print_co2.py
 """
 
+import time
 from datetime import datetime
 
 def _read_real():
@@ -17,7 +18,7 @@ def _read_real():
 def _read_mock():
 	# Provide a simple deterministic-ish mock so logs are readable
 	# (Could import mock_sensors if desired, kept lightweight here.)
-	ts = int(datetime.utcnow().timestamp())
+	ts = int(time.time())
 	pseudo = 400 + (ts % 800)  # cycles between 400-1199
 	return {"co2": pseudo, "source": "mock"}
 
@@ -13,10 +13,11 @@ Logs data to CSV and pushes it in real-time to Firebase RTDB.
 Author: Nivas
 """
 
-import os, csv, time, datetime, json, traceback
+import os, sys, csv, time, datetime, functools, gzip, queue, random, signal, threading, traceback, atexit
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 import board, busio
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
 # Sensor modules
 import bmp180
@@ -29,16 +30,29 @@ from adafruit_ssd1306 import SSD1306_I2C
 
 from PIL import Image, ImageDraw, ImageFont
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# JSON as UTF-8 bytes, ready to send as a request body; NaN is encoded as null
+from orjson import dumps as _dumps
 
 
 # ---------------- CONFIGURATION ----------------
 LOG_INTERVAL = 30  # seconds
 CSV_DIR = "/home/nivas/airstation/logs"
+CSV_FLUSH_EVERY = 10  # rows buffered in memory between CSV writes
+CSV_BUFFER_SIZE = 64 * 1024  # file buffer; a flushed batch always goes out in a single write()
+CSV_FLOAT_FORMAT = ".2f"  # readings stay unrounded in memory; formatted once when written
+# Echo each reading (and Firebase successes) to stdout; off by default under systemd
+LOG_JSON = os.environ.get("AIRSTATION_LOG_JSON", "0") == "1"
 
 # --- Firebase Real-time Configuration ---
 FIREBASE_URL = "https://iot-sensors-pi-78113-default-rtdb.europe-west1.firebasedatabase.app/"
 SENSOR_ID = "raspi_4b"
 USE_FIREBASE = True
+UPLOAD_QUEUE_SIZE = 64  # pending realtime records kept while the uplink is down
+UPLOAD_BATCH_MAX = 20  # records sent together in one PATCH after a backlog builds up
+UPLOAD_GZIP_LEVEL = 1  # PATCH bodies are gzipped; 1 is nearly free on the Pi, 0 sends plain JSON
 # -----------------------------------------------
 
 I2C_BUS_ID = 1
@@ -46,116 +60,288 @@ ADDR_AHT21 = 0x38
 ADDR_ENS160 = 0x52
 ADDR_BMP180 = 0x77
 ADDR_OLED = 0x3C
+MHZ19_READ_TIMEOUT = 3  # seconds to wait for the UART read after the I2C reads finish
 # -----------------------------------------------
 
 
 # ------------------------------------------------
 # Firebase Push
 # ------------------------------------------------
-def send_realtime_data(data: Dict[str, Any]) -> None:
-    """Send one record to Firebase Realtime Database."""
-    if not USE_FIREBASE:
-        return
+def create_session() -> requests.Session:
+    """Session that keeps the TLS connection to Firebase alive between ticks."""
+    session = requests.Session()
+    # Records are written under client-generated keys, so a retried PATCH
+    # overwrites the same children instead of pushing duplicates
+    retry = Retry(
+        total=2,
+        backoff_factor=0.5,
+        status_forcelist=[502, 503, 504],
+        allowed_methods=frozenset({"PATCH"}),
+    )
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=retry))
+    session.headers["Content-Type"] = "application/json"
+    return session
+
+
+_SESSION = create_session()
+
+# Firebase push-ID alphabet, in ASCII order so keys sort chronologically
+PUSH_CHARS = "-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"
+_last_push_ms = 0
+_last_rand: List[int] = [0] * 12
+
+
+def push_id() -> str:
+    """Generate a 20-char Firebase-style push ID (8 time chars + 12 random chars).
+
+    Keys order like server-side POST keys, so readers using order_by_key()
+    see batched records in time order. IDs made within one millisecond
+    increment the random part to stay unique and ordered.
+    """
+    global _last_push_ms
+    now = int(time.time() * 1000)
+    if now == _last_push_ms:
+        i = 11
+        while i >= 0 and _last_rand[i] == 63:
+            _last_rand[i] = 0
+            i -= 1
+        if i >= 0:
+            _last_rand[i] += 1
+    else:
+        _last_push_ms = now
+        _last_rand[:] = [random.randrange(64) for _ in range(12)]
+
+    time_chars = []
+    for _ in range(8):
+        time_chars.append(PUSH_CHARS[now % 64])
+        now //= 64
+    return "".join(reversed(time_chars)) + "".join(PUSH_CHARS[r] for r in _last_rand)
+
+
+def patch_realtime_data(records: List[Dict[str, Any]]) -> None:
+    """Write records to Firebase Realtime Database in one PATCH (blocking)."""
     url = f"{FIREBASE_URL}/{SENSOR_ID}.json"
+    body = {push_id(): record for record in records}
     try:
-        response = requests.post(url, json=data, timeout=5)
+        data = _dumps(body)
+        headers = None
+        if UPLOAD_GZIP_LEVEL:
+            data = gzip.compress(data, compresslevel=UPLOAD_GZIP_LEVEL)
+            headers = {"Content-Encoding": "gzip"}
+        response = _SESSION.patch(url, data=data, headers=headers, timeout=5)
         response.raise_for_status()
-        if response.status_code == 200:
-            print(f"✅ Firebase Success: Data posted for {SENSOR_ID}")
+        if LOG_JSON and response.status_code == 200:
+            print(f"✅ Firebase Success: {len(records)} record(s) posted for {SENSOR_ID}")
     except requests.exceptions.RequestException as e:
         print(f"❌ Firebase Error posting data: {e}")
 
 
+_upload_q: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=UPLOAD_QUEUE_SIZE)
+
+
+def _drain(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Top batch up with whatever is already queued, up to UPLOAD_BATCH_MAX."""
+    while len(batch) < UPLOAD_BATCH_MAX:
+        try:
+            batch.append(_upload_q.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+def _uploader() -> None:
+    # Blocks for the first record, then sends everything that queued up behind it
+    while True:
+        patch_realtime_data(_drain([_upload_q.get()]))
+
+
+def _flush_uploads() -> None:
+    """Send records still queued at shutdown."""
+    while True:
+        batch = _drain([])
+        if not batch:
+            return
+        patch_realtime_data(batch)
+
+
+def start_uploader() -> None:
+    """Start the daemon thread that drains the realtime upload queue."""
+    threading.Thread(target=_uploader, name="firebase-uploader", daemon=True).start()
+    atexit.register(_flush_uploads)
+
+
+def put_drop_oldest(q: queue.Queue, item) -> None:
+    """Put item on a bounded queue without blocking, discarding the oldest entry if full."""
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+
+
+def send_realtime_data(data: Dict[str, Any]) -> None:
+    """Queue one record for Firebase without blocking the sample loop.
+
+    When the queue is full (uplink down), the oldest record is dropped.
+    """
+    if not USE_FIREBASE:
+        return
+    put_drop_oldest(_upload_q, data)
+
+
 # ------------------------------------------------
 # Sensor Classes
 # ------------------------------------------------
+# Expected read failures (bus/serial I/O, bad data, busy drivers). Anything else
+# propagates to main(), which records it as a catastrophic sensor error.
+READ_ERRORS = (OSError, ValueError, RuntimeError, AttributeError)
+
+
+class SensorBus:
+    """The shared I2C handle, a lock serialising transactions on it, and the
+    latest values other devices can reuse instead of measuring again."""
+
+    def __init__(self, i2c):
+        self.i2c = i2c
+        self.lock = threading.Lock()
+        self.cache: Dict[str, Any] = {}
+
+
 class AHT21Sensor:
-    def __init__(self, i2c_bus):
+    def __init__(self, bus: SensorBus):
+        self.name = type(self).__name__
+        self.bus = bus
         try:
-            self.sensor = AHTx0(i2c_bus, address=ADDR_AHT21)
+            self.sensor = AHTx0(bus.i2c, address=ADDR_AHT21)
             self.present = True
         except Exception:
             self.present = False
             self.sensor = None
+        # Decided once: an absent sensor answers with a fresh dict, no per-tick probing
+        self.read = self._read_live if self.present else functools.partial(dict, aht21_present=False)
 
-    def read(self):
-        if not self.present:
-            return {"aht21_present": False}
+    def _read_live(self):
         try:
+            with self.bus.lock:
+                t = self.sensor.temperature
+                h = self.sensor.relative_humidity
+            self.bus.cache["aht21"] = (t, h)
             return {
                 "aht21_present": True,
-                "temperature_C": round(self.sensor.temperature, 2),
-                "humidity_pct": round(self.sensor.relative_humidity, 2)
+                "temperature_C": t,
+                "humidity_pct": h,
             }
-        except Exception as e:
+        except READ_ERRORS as e:
+            self.bus.cache.pop("aht21", None)
             return {"aht21_present": True, "aht21_error": str(e)}
 
 
 class ENS160Sensor:
-    def __init__(self, i2c_bus):
+    # Only rewrite the compensation registers when AHT21 moved by more than this
+    COMP_TEMP_STEP = 0.5  # °C
+    COMP_RH_STEP = 2.0  # %RH
+
+    def __init__(self, bus: SensorBus):
+        self.name = type(self).__name__
+        self.bus = bus
+        self._comp = None  # (t, h) last written to the sensor
         try:
-            self.sensor = ENS160(i2c_bus, address=ADDR_ENS160)
+            self.sensor = ENS160(bus.i2c, address=ADDR_ENS160)
             self.present = True
         except Exception:
             self.present = False
             self.sensor = None
+        self.read = self._read_live if self.present else functools.partial(dict, ens160_present=False)
 
-    def read(self):
-        if not self.present:
-            return {"ens160_present": False}
+    def _compensate(self):
+        """Feed AHT21's reading (read earlier this tick) into ENS160's compensation."""
+        th = self.bus.cache.get("aht21")
+        if th is None:
+            return
+        if self._comp is not None and abs(th[0] - self._comp[0]) < self.COMP_TEMP_STEP \
+                and abs(th[1] - self._comp[1]) < self.COMP_RH_STEP:
+            return
+        self.sensor.temperature_compensation = th[0]
+        self.sensor.humidity_compensation = th[1]
+        self._comp = th
+
+    def _read_live(self):
         try:
-            return {
-                "ens160_present": True,
-                "AQI": self.sensor.AQI,
-                "TVOC_ppb": self.sensor.TVOC,
-                "eCO2_ppm": self.sensor.eCO2,
-            }
-        except Exception as e:
+            with self.bus.lock:
+                self._compensate()
+                return {
+                    "ens160_present": True,
+                    "AQI": self.sensor.AQI,
+                    "TVOC_ppb": self.sensor.TVOC,
+                    "eCO2_ppm": self.sensor.eCO2,
+                }
+        except READ_ERRORS as e:
             return {"ens160_present": True, "ens160_error": str(e)}
 
 
 class BMP180Sensor:
-    def __init__(self, i2c_bus):
+    def __init__(self, bus: SensorBus):
+        self.name = type(self).__name__
+        self.bus = bus
         try:
-            self.sensor = bmp180.BMP180(i2c_bus)
+            self.sensor = bmp180.BMP180(bus.i2c)
             self.sensor.sea_level_pressure = 1013.25
             self.present = True
         except Exception:
             self.present = False
             self.sensor = None
+        self.read = self._read_live if self.present else functools.partial(dict, bmp180_present=False)
 
-    def read(self):
-        if not self.present:
-            return {"bmp180_present": False}
+    def _read_live(self):
         try:
-            t = self.sensor.temperature
-            p = self.sensor.pressure
-            a = self.sensor.altitude
+            with self.bus.lock:
+                t = self.sensor.temperature
+                p = self.sensor.pressure
+                a = self.sensor.altitude
             return {
                 "bmp180_present": True,
-                "temperature_C": round(t, 2),
-                "pressure_hPa": round(p, 2),
-                "altitude_m": round(a, 2)
+                "temperature_C": t,
+                "pressure_hPa": p,
+                "altitude_m": a,
             }
-        except Exception as e:
+        except READ_ERRORS as e:
             return {"bmp180_present": True, "bmp180_error": str(e)}
 
 
+# Single worker: overlaps the UART read with I2C, but never runs two reads on the port
+_SERIAL_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mhz19")
+
+
 class MHZ19Sensor:
+    MAX_BACKOFF = 300  # seconds
+
     def __init__(self):
+        self.name = type(self).__name__
         self.present = True
+        # Consecutive failures back off exponentially so a dead UART doesn't stall every tick
+        self._fail_count = 0
+        self._skip_until = 0.0
+
+    def _failed(self, msg):
+        self._fail_count += 1
+        self._skip_until = time.monotonic() + min(self.MAX_BACKOFF, 2 ** self._fail_count)
+        return {"mhz19_present": True, "mhz19_error": msg}
 
     def read(self):
-        if not self.present:
-            return {"mhz19_present": False}
+        if time.monotonic() < self._skip_until:
+            return {"mhz19_present": True, "mhz19_error": f"skipped after {self._fail_count} failures"}
         try:
             data = mh_z19.read()
             if isinstance(data, dict) and "co2" in data:
+                self._fail_count = 0
                 return {"mhz19_present": True, "co2_ppm": data["co2"]}
-            return {"mhz19_present": True, "mhz19_error": "Invalid response"}
-        except Exception as e:
-            self.present = False
-            return {"mhz19_present": True, "mhz19_error": str(e)}
+            return self._failed("Invalid response")
+        except READ_ERRORS as e:
+            return self._failed(str(e))
 
 
 # ------------------------------------------------
@@ -180,64 +366,145 @@ def _try_load_ttf(size: int) -> Optional[ImageFont.FreeTypeFont]:
 # ------------------------------------------------
 # Data Logger
 # ------------------------------------------------
+class FloatFormatDictWriter(csv.DictWriter):
+    """DictWriter that writes float values with CSV_FLOAT_FORMAT.
+
+    Values are formatted as DictWriter picks the header's fields out of a
+    row, so no formatted copy of the row is built. The reading itself is
+    left untouched, since the uploader and display threads share it.
+    """
+
+    def _dict_to_list(self, rowdict):
+        return (
+            format(v, CSV_FLOAT_FORMAT) if isinstance(v, float) else v
+            for v in super()._dict_to_list(rowdict)
+        )
+
+
 class DataLogger:
-    def __init__(self, directory=CSV_DIR):
+    BASE_FIELDS = (
+        "timestamp",
+        "aht21_present", "temperature_C", "humidity_pct",
+        "ens160_present", "AQI", "TVOC_ppb", "eCO2_ppm",
+        "bmp180_present", "pressure_hPa", "altitude_m",
+        "mhz19_present", "co2_ppm",
+    )
+    # A file keeps one header all day. Keys outside it (the per-sensor *_error
+    # fields) are dropped by extrasaction="ignore"; their text is in "errors".
+    FIELDNAMES = (*BASE_FIELDS, "errors")
+
+    def __init__(self, directory=CSV_DIR, flush_every=CSV_FLUSH_EVERY):
         self.directory = Path(directory)
         self.directory.mkdir(parents=True, exist_ok=True)
+        # Open CSV for the current day; rotated when the date rolls over
+        self._fh = None
+        self._writer = None
+        self._current_date = None
+        self._fname = None
+        # Rows not yet written; flushed in batches, on rotation and at exit
+        self._pending = []
+        self._flush_every = flush_every
+        atexit.register(self.close)
+
+    def _rotate(self, today):
+        """Close the previous day's file and open today's in append mode.
+
+        The path and its existence check are only worked out here, once per day.
+        A file that already exists (service restarted mid-day) keeps its own
+        header, so appended rows always line up with it.
+        """
+        self.close()
+        self._fname = self.directory / f"{today}.csv"
+        newfile = not self._fname.exists() or self._fname.stat().st_size == 0
+        fieldnames = list(self.FIELDNAMES)
+        if not newfile:
+            with open(self._fname, newline="") as f:
+                fieldnames = next(csv.reader(f), None) or fieldnames
+        self._fh = open(self._fname, "a", newline="", buffering=CSV_BUFFER_SIZE)
+        # extrasaction="ignore" skips keys outside the header, so rows need no filtering copy
+        self._writer = FloatFormatDictWriter(self._fh, fieldnames=fieldnames, restval="", extrasaction="ignore")
+        if newfile:
+            self._writer.writeheader()
+        self._current_date = today
+
+    def flush(self):
+        """Write buffered rows to the current file."""
+        if self._pending and self._writer is not None:
+            self._writer.writerows(self._pending)
+            self._fh.flush()
+        self._pending.clear()
+
+    def close(self):
+        self.flush()
+        if self._fh is not None:
+            # Finished day / shutdown: make sure the rows are on the SD card, not just in page cache
+            os.fsync(self._fh.fileno())
+            self._fh.close()
+            self._fh = None
+            self._writer = None
 
     def log_csv(self, data):
-        fname = self.directory / f"{datetime.date.today()}.csv"
-        newfile = not fname.exists()
-        data_to_log = {k: v for k, v in data.items() if k != "errors"}
-
-        base_fields = [
-            "timestamp",
-            "aht21_present", "temperature_C", "humidity_pct",
-            "ens160_present", "AQI", "TVOC_ppb", "eCO2_ppm",
-            "bmp180_present", "pressure_hPa", "altitude_m",
-            "mhz19_present", "co2_ppm",
-        ]
-
-        err_fields = sorted([k for k in data_to_log.keys() if k.endswith("_error")])
-        fieldnames = base_fields + err_fields
-        unique_fields = []
-        for f in fieldnames:
-            if f not in unique_fields:
-                unique_fields.append(f)
-        for k in data_to_log.keys():
-            if k not in unique_fields:
-                unique_fields.append(k)
-
-        with open(fname, "a", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=unique_fields, restval="", extrasaction="ignore")
-            if newfile:
-                writer.writeheader()
-            writer.writerow(data_to_log)
+        today = datetime.date.today()
+        if today != self._current_date or self._fh is None:
+            self._rotate(today)
+
+        self._pending.append(data)
+        if len(self._pending) >= self._flush_every:
+            self.flush()
 
 
 # ------------------------------------------------
 # OLED Display Manager
 # ------------------------------------------------
 class DisplayManager:
-    def __init__(self, i2c_bus):
+    def __init__(self, bus: SensorBus):
+        self.bus = bus
         try:
-            self.oled = SSD1306_I2C(128, 32, i2c_bus, addr=ADDR_OLED)
+            self.oled = SSD1306_I2C(128, 32, bus.i2c, addr=ADDR_OLED)
             font_ttf = _try_load_ttf(14)
             self.font = font_ttf if font_ttf else ImageFont.load_default()
+            # One canvas redrawn every tick, plus rasterised lines keyed by their text
+            self._img = Image.new("1", (self.oled.width, self.oled.height))
+            self._draw = ImageDraw.Draw(self._img)
+            self._line_bitmap = functools.lru_cache(maxsize=64)(self._rasterise)
+            self._last_lines = None  # text of the frame currently on the panel
             self.available = True
         except Exception as e:
             print(f"OLED init error: {e}")
             self.available = False
 
+    def _rasterise(self, line: str):
+        """Render line once into a 1-bit mask (memoised per instance as _line_bitmap).
+
+        Returns (mask, (left, top), width), where (left, top) is the ink offset from
+        the text origin. Readings change slowly, so most frames only stamp cached
+        masks and freetype runs only when a line's text changes.
+        """
+        left, top, right, bottom = self._draw.textbbox((0, 0), line, font=self.font)
+        mask = Image.new("1", (max(1, right - left), max(1, bottom - top)))
+        ImageDraw.Draw(mask).text((-left, -top), line, font=self.font, fill=255)
+        return mask, (left, top), right - left
+
+    def _stamp(self, line: str, y: int):
+        """Draw line horizontally centred at row y from its cached mask."""
+        mask, (left, top), width = self._line_bitmap(line)
+        x = (128 - width) // 2
+        self._img.paste(255, (x + left, y + top), mask)
+
+    def show_reading(self, readings):
+        """Show one reading's T/H and CO₂, falling back to ENS160 eCO₂ without MH-Z19."""
+        co2 = readings.get("co2_ppm")
+        from_ens = False
+        if co2 is None or co2 <= 0:
+            co2 = readings.get("eCO2_ppm")
+            from_ens = True
+        self.show_summary(readings.get("temperature_C"), readings.get("humidity_pct"), co2, from_ens)
+
     def show_summary(self, t, h, co2, from_ens=False):
         """Display temperature, humidity, and CO₂/eCO₂ on OLED."""
         if not self.available:
             return
         try:
-            self.oled.fill(0)
-            image = Image.new("1", (self.oled.width, self.oled.height))
-            draw = ImageDraw.Draw(image)
-
             def fmt_t(val):
                 return f"{val:4.1f}°C" if val is not None else "---"
 
@@ -254,84 +521,135 @@ class DisplayManager:
 
             line1 = f"{t_str}     {h_str}"
             line2 = f"{label}: {co2_str}"
+            # Same text means the same frame: skip the render and the I2C flush
+            if (line1, line2) == self._last_lines:
+                return
+
+            self._draw.rectangle((0, 0, self.oled.width, self.oled.height), fill=0)
+            self._stamp(line1, 0)
+            self._stamp(line2, 17)
+
+            self.oled.image(self._img)
+            with self.bus.lock:
+                self.oled.show()
+            self._last_lines = (line1, line2)
+        except Exception as e:
+            print("OLED error:", e)
 
-            bbox1 = draw.textbbox((0, 0), line1, font=self.font)
-            w1 = bbox1[2] - bbox1[0]
-            x1 = (128 - w1) // 2
 
-            bbox2 = draw.textbbox((0, 0), line2, font=self.font)
-            w2 = bbox2[2] - bbox2[0]
-            x2 = (128 - w2) // 2
+# ------------------------------------------------
+# Output Workers
+# ------------------------------------------------
+def start_worker(name: str, q: queue.Queue, handle) -> threading.Thread:
+    """Call handle(item) for each item put on q, on a daemon thread, until None arrives."""
+    def run():
+        while True:
+            item = q.get()
+            if item is None:
+                return
+            try:
+                handle(item)
+            except Exception:
+                print(f"{name} error:", traceback.format_exc())
 
-            draw.text((x1, 0), line1, font=self.font, fill=255)
-            draw.text((x2, 17), line2, font=self.font, fill=255)
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
 
-            self.oled.image(image)
-            self.oled.show()
-        except Exception as e:
-            print("OLED error:", e)
+
+def stop_worker(q: queue.Queue, thread: threading.Thread, timeout: float = 5.0) -> None:
+    """Let a worker finish what is already queued, then stop it."""
+    q.put(None)
+    thread.join(timeout)
 
 
 # ------------------------------------------------
 # Main Loop
 # ------------------------------------------------
 def main():
+    # systemd stops the service with SIGTERM; exit normally so atexit flushes the CSV
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
     try:
         i2c_bus = busio.I2C(board.SCL, board.SDA)
     except Exception as e:
         print(f"I2C init failed: {e}")
         i2c_bus = None
 
-    aht21 = AHT21Sensor(i2c_bus)
-    ens160 = ENS160Sensor(i2c_bus)
-    bmp180_s = BMP180Sensor(i2c_bus)
+    bus = SensorBus(i2c_bus)
+    aht21 = AHT21Sensor(bus)
+    ens160 = ENS160Sensor(bus)
+    bmp180_s = BMP180Sensor(bus)
     mhz19 = MHZ19Sensor()
 
-    sensors = [aht21, ens160, bmp180_s, mhz19]
-    display = DisplayManager(i2c_bus)
+    i2c_sensors = [aht21, ens160, bmp180_s]
+    display = DisplayManager(bus)
     logger = DataLogger()
-
+    if USE_FIREBASE:
+        start_uploader()
+
+    # CSV and OLED run on their own threads so SD-card or bus stalls never delay sampling.
+    # Every reading is logged (drained at exit, before the logger closes); the
+    # display only ever needs the newest one.
+    csv_q: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+    atexit.register(stop_worker, csv_q, start_worker("csv-writer", csv_q, logger.log_csv))
+    display_q: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=1)
+    start_worker("oled", display_q, display.show_reading)
+
+    # Ticks are scheduled against a monotonic deadline, so time spent reading,
+    # logging and drawing does not stretch the period beyond LOG_INTERVAL
+    deadline = time.monotonic()
     while True:
         readings = {"timestamp": datetime.datetime.now().isoformat(timespec="seconds")}
         errors = []
 
-        for s in sensors:
+        def record(s, read):
             try:
-                d = s.read()
+                d = read()
                 readings.update(d)
                 if any(k.endswith("_error") for k in d.keys()):
                     errors.append(str(d))
             except Exception as e:
-                msg = f"{type(s).__name__} catastrophic: {e}"
-                readings[f"{type(s).__name__}_error"] = msg
+                msg = f"{s.name} catastrophic: {e}"
+                readings[f"{s.name}_error"] = msg
                 errors.append(msg)
 
+        def mhz19_result():
+            try:
+                return co2_future.result(timeout=MHZ19_READ_TIMEOUT)
+            except FutureTimeout:
+                return {"mhz19_present": True, "mhz19_error": "read timeout"}
+
+        # MH-Z19 is on the UART, so its read runs while the I2C bus is polled
+        co2_future = _SERIAL_POOL.submit(mhz19.read)
+        for s in i2c_sensors:  # shared bus: these stay sequential
+            record(s, s.read)
+        record(mhz19, mhz19_result)
+
         if errors:
             readings["errors"] = "; ".join(errors)
 
         try:
             # 1. Log to CSV
-            logger.log_csv(readings)
+            csv_q.put(readings)
 
             # 2. Firebase
             send_realtime_data(readings)
 
             # 3. Display
-            t = readings.get("temperature_C")
-            h = readings.get("humidity_pct")
-
-            co2 = readings.get("co2_ppm")
-            from_ens = False
-            if co2 is None or co2 <= 0:
-                co2 = readings.get("eCO2_ppm")
-                from_ens = True
-
-            display.show_summary(t, h, co2, from_ens)
-            print(json.dumps(readings, indent=2))
+            put_drop_oldest(display_q, readings)
+            if LOG_JSON:
+                sys.stdout.write(_dumps(readings).decode() + "\n")
         except Exception:
             print("Logging/Display error:", traceback.format_exc())
 
-        time.sleep(LOG_INTERVAL)
+        deadline += LOG_INTERVAL
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        else:
+            # Fell more than a full interval behind: re-anchor instead of bursting
+            deadline = time.monotonic()
 
 
 if __name__ == "__main__":
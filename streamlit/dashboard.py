@@ -1,13 +1,17 @@
 import streamlit as st
 import pyrebase
+import numpy as np
 import pandas as pd
+import plotly.graph_objects as go
+import threading
 import time
 from datetime import datetime
 
 # --- 1. FIREBASE INITIALIZATION & SECRETS ---
 # Reads secrets securely from Streamlit Cloud's secrets manager
 
-try:
+@st.cache_resource # One Firebase app per server process, shared by every rerun and session
+def get_database():
     # 1. Read the configuration you saved in Streamlit Cloud under [firebase]
     firebase_config = dict(st.secrets['firebase'])
     
@@ -15,7 +19,10 @@ try:
     firebase = pyrebase.initialize_app(firebase_config)
     
     # 3. Get the Realtime Database reference
-    db = firebase.database()
+    return firebase.database()
+
+try:
+    db = get_database()
 
 except KeyError:
     st.error("Error: Firebase configuration not found in Streamlit Secrets. Please ensure you have a [firebase] section.")
@@ -28,27 +35,53 @@ except Exception as e:
 # --- 2. OPTIMIZED DATA FETCHING FUNCTION ---
 # Uses caching and server-side limiting to reduce data download/load time
 
+MAX_RECORDS = 1000  # Upper bound of the data-points slider
+
+@st.cache_resource # Survives reruns, so each refresh only downloads what is new
+def get_record_cache(data_path):
+    """
+    Records fetched so far for data_path, in push-ID order, and the frames built from them:
+    (lock, {push_id: record}, {limit: (newest push_id, DataFrame)}).
+    """
+    return threading.Lock(), {}, {}
+
+
 @st.cache_data(ttl=60) # Cache data for 60 seconds (1 minute)
 def load_data(data_path="airstation_readings", limit=200):
     """
     Fetches the latest 'limit' records from Firebase using server-side ordering/limiting.
+    Records already downloaded are kept, so later calls only ask for newer ones,
+    and the frame is only rebuilt when one arrived.
     """
-    st.info(f"Fetching data from Firebase (limited to last {limit} records)...")
+    lock, cache, frames = get_record_cache(data_path)
     try:
-        # Optimization: Use limit_to_last() for server-side filtering
-        data = (
-            db.child(data_path)
-            .order_by_key()  # Orders by the time-based push ID
-            .limit_to_last(limit)
-            .get()
-            .val()
-        )
-        
+        with lock:
+            # Optimization: Use limit_to_last() for server-side filtering
+            query = db.child(data_path).order_by_key()  # Orders by the time-based push ID
+            incremental = len(cache) >= limit
+            if incremental:
+                # Push IDs sort by time: start at the newest key already held
+                query = query.start_at(next(reversed(cache)))
+            else:
+                st.info(f"Fetching data from Firebase (limited to last {limit} records)...")
+            data = query.limit_to_last(limit).get().val() or {}
+            if not incremental or len(data) >= limit:
+                cache.clear()  # A full window, or too many new records to stitch on
+            cache.update(data)
+            # Keep enough for the largest window the slider offers
+            for key in list(cache)[:-MAX_RECORDS]:
+                del cache[key]
+            data = dict(list(cache.items())[-limit:])
+            newest = next(reversed(data), None)
+            if newest is not None and frames.get(limit, (None,))[0] == newest:
+                return frames[limit][1]  # Nothing new upstream since the last build
+
         if not data:
             return pd.DataFrame()
             
-        # Convert dictionary of records (Firebase Push IDs are keys) into a DataFrame
-        df = pd.DataFrame.from_dict(data, orient='index')
+        # Convert dictionary of records (Firebase Push IDs are keys) into a DataFrame;
+        # the list-of-dicts path is faster than from_dict's dict-of-dicts one
+        df = pd.DataFrame.from_records(list(data.values()), index=list(data))
         
         # --- Data Cleaning and Formatting (Adjust as needed for your keys) ---
         
@@ -57,13 +90,25 @@ def load_data(data_path="airstation_readings", limit=200):
         for col in numeric_cols:
             if col in df.columns:
                 df[col] = pd.to_numeric(df[col], errors='coerce')
+        # Sensor values carry a few significant figures: float32 halves the frame.
+        # Not the timestamp: float32 cannot resolve epoch seconds (~1.7e9) below 128 s.
+        float_cols = df.select_dtypes('float').columns.drop('timestamp', errors='ignore')
+        df[float_cols] = df[float_cols].astype('float32')
         
         # If your data has a 'timestamp' column, convert it to datetime
         if 'timestamp' in df.columns:
-             # Assuming timestamp is stored as seconds since epoch (unit='s')
-             df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s', errors='coerce')
+             # capture.py sends ISO 8601 strings; older records may hold epoch seconds,
+             # so a column can mix both. Numbers parse with unit='s', the rest as ISO.
+             ts = df['timestamp']
+             secs = pd.to_numeric(ts, errors='coerce')
+             parsed = pd.to_datetime(secs, unit='s', errors='coerce')
+             text = secs.isna() & ts.notna()
+             if text.any():
+                 parsed[text] = pd.to_datetime(ts[text], format='ISO8601', errors='coerce')
+             df['timestamp'] = parsed
              df = df.sort_values('timestamp').set_index('timestamp')
         
+        frames[limit] = (newest, df)
         return df
 
     except Exception as e:
@@ -71,6 +116,21 @@ def load_data(data_path="airstation_readings", limit=200):
         return pd.DataFrame()
 
 
+@st.cache_data(ttl=60) # Reruns that only touch the controls reuse the built figure
+def build_trend_figure(df):
+    """
+    One Scattergl line per column of df, against its timestamp index.
+    """
+    # Scattergl draws on one WebGL canvas; st.line_chart renders through Vega
+    ts = df.index.to_numpy()  # Plain arrays: shared x, no pandas boxing per trace
+    fig = go.Figure([
+        go.Scattergl(x=ts, y=df[col].to_numpy(), mode="lines", name=col)
+        for col in df.columns
+    ])
+    fig.update_layout(margin=dict(l=0, r=0, t=10, b=0), legend=dict(orientation="h"))
+    return fig
+
+
 # --- 3. STREAMLIT DASHBOARD LAYOUT ---
 
 st.set_page_config(
@@ -89,7 +149,7 @@ with st.sidebar:
     data_limit = st.slider(
         "Recent data points to display:",
         min_value=50,
-        max_value=1000,
+        max_value=MAX_RECORDS,
         value=200,
         step=50
     )
@@ -97,12 +157,21 @@ with st.sidebar:
     # Button to clear the cache and force a new data download
     if st.button("Force Data Refresh 🔄"):
         st.cache_data.clear()
+        get_record_cache.clear()  # Drop the downloaded records too, so the next load is a full fetch
         st.experimental_rerun()
     
     st.markdown("---")
     st.markdown("Data is automatically refreshed every **60 seconds**.")
 
 
+# Latest-reading cards: field -> (label, unit, decimals)
+METRICS = {
+    'pm25': ("PM2.5", "µg/m³", 2),
+    'pm10': ("PM10", "µg/m³", 2),
+    'temp': ("Temperature", "°C", 1),
+    'humidity': ("Humidity", "%", 1),
+}
+
 # Main content area
 data_path = "airstation_readings" # Verify this is your actual Firebase Realtime DB node name
 df_data = load_data(data_path, data_limit)
@@ -110,16 +179,13 @@ df_data = load_data(data_path, data_limit)
 if df_data.empty:
     st.warning("No data found or fetching failed. Check your Firebase path and data structure.")
 else:
-    # Display the latest snapshot
-    latest_reading = df_data.iloc[-1].fillna('N/A')
+    # Display the latest snapshot: one float row, missing/NaN fields shown as N/A
+    latest_values = df_data.iloc[-1:].reindex(columns=list(METRICS)).to_numpy(dtype=np.float64)[0]
     
     st.subheader("Latest Readings")
 
-    col1, col2, col3, col4 = st.columns(4)
-    col1.metric("PM2.5", f"{latest_reading.get('pm25', 0):.2f} µg/m³")
-    col2.metric("PM10", f"{latest_reading.get('pm10', 0):.2f} µg/m³")
-    col3.metric("Temperature", f"{latest_reading.get('temp', 0):.1f} °C")
-    col4.metric("Humidity", f"{latest_reading.get('humidity', 0):.1f} %")
+    for col, (label, unit, digits), value in zip(st.columns(len(METRICS)), METRICS.values(), latest_values):
+        col.metric(label, f"{value:.{digits}f} {unit}" if np.isfinite(value) else "N/A")
 
     st.markdown("---")
     st.subheader(f"Time-series Trends (Last {len(df_data)} points)")
@@ -127,7 +193,7 @@ else:
     # Create a line chart for PM values
     chart_cols = [col for col in ['pm25', 'pm10'] if col in df_data.columns]
     if chart_cols:
-        st.line_chart(df_data[chart_cols])
+        st.plotly_chart(build_trend_figure(df_data[chart_cols]), use_container_width=True)
     
     # Display the raw data table
     st.markdown("---")